@@ -360,7 +360,7 @@ async def login(
 
 
 @router.post("/logout")
-async def logout(response: Response):
+def logout(response: Response):
     clear_auth_cookies(response)
     return {"message": "Logged out successfully"}
 
@@ -593,12 +593,12 @@ async def check_username(username: str, database: Database = Depends(get_db)):
 
 
 @router.get("/me")
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+def get_current_user_info(current_user: User = Depends(get_current_user)):
     return current_user
 
 
 @router.get("/google")
-async def google_login():
+def google_login():
     url = f"https://accounts.google.com/o/oauth2/v2/auth"
     params = {
         "client_id": os.getenv("GOOGLE_CLIENT_ID"),
@@ -708,7 +708,7 @@ async def google_callback(
 
 
 @router.get("/github")
-async def github_login():
+def github_login():
     url = "https://github.com/login/oauth/authorize"
     params = {
         "client_id": os.getenv("GITHUB_CLIENT_ID"),
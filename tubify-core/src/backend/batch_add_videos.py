@@ -81,8 +81,9 @@ async def get_songs_without_videos(
     ORDER BY swv.song_name
     """
 
-    rows = await conn.fetch(query, limit)
-    return [dict(row) for row in rows]
+    # asyncpg records are mapping-compatible, so callers can read them
+    # directly without copying every row into a dict first
+    return await conn.fetch(query, limit)
 
 
 async def search_with_retry(
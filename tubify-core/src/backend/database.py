@@ -1,4 +1,5 @@
 from databases import Database
+import asyncio
 import os
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
@@ -7,8 +8,33 @@ from fastapi import FastAPI
 # load environment variables
 load_dotenv()
 
-# initialize database
-database = Database(os.getenv("DATABASE_URL"))
+# initialize database; the statement cache keeps hot queries prepared on
+# each connection so postgres skips parse/plan on repeat executions, and
+# the pool is sized so bursts of spotify-bound requests don't exhaust
+# connections and stall everyone else
+database = Database(
+    os.getenv("DATABASE_URL"),
+    min_size=10,
+    max_size=50,
+    max_inactive_connection_lifetime=300,
+    statement_cache_size=1024,
+)
+
+# how often to refresh the pre-aggregated ratings view; a concurrent
+# refresh re-runs the full aggregate, so it runs on a schedule here
+# instead of on every review write
+SONG_RATING_AGG_REFRESH_SECONDS = 60
+
+
+async def _refresh_song_rating_agg_loop():
+    while True:
+        await asyncio.sleep(SONG_RATING_AGG_REFRESH_SECONDS)
+        try:
+            await database.execute(
+                "REFRESH MATERIALIZED VIEW CONCURRENTLY song_rating_agg"
+            )
+        except Exception as e:
+            print(f"***error refreshing song_rating_agg: {e}***")
 
 
 # database lifespan context manager
@@ -29,8 +55,16 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"***error initializing schema: {e}***")
 
+    # keep the ratings view fresh in the background
+    refresh_task = asyncio.create_task(_refresh_song_rating_agg_loop())
+
     yield
 
-    # disconnect from database on shutdown
+    # stop the refresh loop and disconnect from database on shutdown
+    refresh_task.cancel()
+    try:
+        await refresh_task
+    except asyncio.CancelledError:
+        pass
     await database.disconnect()
     print("***database disconnected***")
@@ -20,7 +20,7 @@ class ListeningHabitsData(BaseModel):
 
 
 @router.get("/", response_model=ListeningHabitsData)
-async def get_listening_habits(
+def get_listening_habits(
     user: User = Depends(get_current_user),
     sp: spotipy.Spotify = Depends(get_spotify_client),
     artists_time_range: str = Query(
@@ -4,7 +4,7 @@ from pydantic import BaseModel
 from datetime import datetime, timezone
 from auth import get_current_user, User
 from database import database
-from spotify_auth import get_spotify_client
+from spotify_auth import get_spotify_client, invalidate_playlists_cache
 import spotipy, os, json, random, string
 import time
 import asyncio
@@ -131,6 +131,10 @@ async def create_playlist(
 
             print(f"Exception traceback: {traceback.format_exc()}")
 
+    # the imported flags in the cached spotify playlists response are now stale
+    if playlist.spotify_playlist_id:
+        invalidate_playlists_cache(user.id)
+
     return await get_playlist(public_id, user)
 
 
@@ -1083,6 +1087,9 @@ async def update_playlist(
         """
         await database.execute(query, values=values)
 
+    # the update may change which spotify playlists count as imported
+    invalidate_playlists_cache(user.id)
+
     return await get_playlist(public_id, user)
 
 
@@ -1105,6 +1112,9 @@ async def delete_playlist(public_id: str, user: User = Depends(get_current_user)
         values={"id": existing["id"]},
     )
 
+    # deleting an imported playlist changes the is_imported flags
+    invalidate_playlists_cache(user.id)
+
     return {"message": "playlist deleted successfully"}
 
 
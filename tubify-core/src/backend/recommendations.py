@@ -1447,9 +1447,9 @@ async def get_user_recommendation_feedback(user_id: int = Depends(get_current_us
         """
 
         rows = await database.fetch_all(query, {"user_id": user_id})
-        feedback = [dict(row) for row in rows]
 
-        return {"feedback": feedback}
+        # the rows are serialized as-is; no need to copy them into dicts
+        return {"feedback": rows}
     except Exception as e:
         logger.error(f"error retrieving user feedback: {e}")
         raise HTTPException(
@@ -1,5 +1,9 @@
+import asyncio
+import time
+
 from fastapi import APIRouter, HTTPException, Depends, Query, status
 from typing import Optional, List
+from pydantic import BaseModel, Field
 from auth import get_current_user, User
 from database import database
 import spotipy
@@ -7,6 +11,19 @@ from spotify_auth import get_spotify_client
 
 router = APIRouter(prefix="/api/reviews", tags=["reviews"])
 
+# per-process cache of username -> user id; ids never change, but
+# usernames can be reassigned through profile updates, so entries carry
+# a short ttl instead of living forever
+_USERNAME_CACHE_TTL = 60.0
+_username_id_cache = {}
+
+
+# models
+class SongReviewCreate(BaseModel):
+    song_id: str
+    rating: int = Field(..., ge=1, le=5)
+    review_text: Optional[str] = None
+
 
 @router.post("/songs")
 async def add_song_review(
@@ -242,12 +259,13 @@ async def add_song_review(
                     detail=f"Failed to import song from Spotify: {str(e)}",
                 )
 
-        # now add the review
-        review_id = await database.execute(
+        # now add the review, returning the full row so the response
+        # carries the server-assigned created_at without a second query
+        review = await database.fetch_one(
             """
             INSERT INTO song_reviews (user_id, song_id, rating, review_text)
             VALUES (:user_id, :song_id, :rating, :review_text)
-            RETURNING id
+            RETURNING id, user_id, song_id, rating, review_text, created_at
             """,
             {
                 "user_id": user.id,
@@ -256,32 +274,117 @@ async def add_song_review(
                 "review_text": review_text,
             },
         )
-        return {
-            "id": review_id,
-            "user_id": user.id,
-            "song_id": song_id,
-            "rating": rating,
-            "review_text": review_text,
-        }
+        # song_rating_agg picks up the new review on its periodic refresh
+
+        return dict(review)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to add song review: {e}")
 
 
-@router.get("/all")
-async def get_all_reviews(user: User = Depends(get_current_user)):
-    """Get all reviews from the user and their friends, sorted by recency."""
+@router.post("/songs/bulk")
+async def add_song_reviews_bulk(
+    reviews: List[SongReviewCreate],
+    user: User = Depends(get_current_user),
+):
+    """Add multiple song reviews in a single batched insert."""
+    if not reviews:
+        return {"inserted": 0, "skipped": []}
+
     try:
-        friends_query = """
-            SELECT friend_id 
-            FROM friendships 
-            WHERE user_id = :user_id
+        # only review songs already in the database; unknown songs go
+        # through the single-review endpoint, which imports them from spotify
+        song_ids = [review.song_id for review in reviews]
+        known_songs = await database.fetch_all(
+            "SELECT id FROM songs WHERE id = ANY(:song_ids)", {"song_ids": song_ids}
+        )
+        known_ids = {song["id"] for song in known_songs}
+
+        values = [
+            {
+                "user_id": user.id,
+                "song_id": review.song_id,
+                "rating": review.rating,
+                "review_text": review.review_text,
+            }
+            for review in reviews
+            if review.song_id in known_ids
+        ]
+        skipped = [song_id for song_id in song_ids if song_id not in known_ids]
+
+        # one pipelined round-trip for the whole batch instead of one
+        # insert per review
+        if values:
+            await database.execute_many(
+                query="""
+                INSERT INTO song_reviews (user_id, song_id, rating, review_text)
+                VALUES (:user_id, :song_id, :rating, :review_text)
+                ON CONFLICT (user_id, song_id) DO UPDATE SET
+                    rating = EXCLUDED.rating,
+                    review_text = EXCLUDED.review_text
+                """,
+                values=values,
+            )
+
+        # song_rating_agg picks up the batch on its periodic refresh
+        return {"inserted": len(values), "skipped": skipped}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to add song reviews: {e}")
+
+
+@router.get("/songs/top")
+async def get_top_rated_songs(
+    limit: int = Query(10, ge=1, le=50),
+    user: User = Depends(get_current_user),
+):
+    """Get the highest-rated songs from the pre-aggregated ratings view."""
+    try:
+        query = """
+            SELECT
+                agg.song_id,
+                agg.avg_rating,
+                agg.review_count,
+                s.name as song_name,
+                al.name as album_name,
+                al.image_url as album_art_url
+            FROM song_rating_agg agg
+            JOIN songs s ON agg.song_id = s.id
+            JOIN albums al ON s.album_id = al.id
+            ORDER BY agg.avg_rating DESC, agg.review_count DESC
+            LIMIT :limit
         """
-        friends = await database.fetch_all(friends_query, {"user_id": user.id})
+
+        return await database.fetch_all(query, {"limit": limit})
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to fetch top rated songs: {e}"
+        )
+
+
+@router.get("/all")
+async def get_all_reviews(
+    user: User = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+):
+    """Get reviews from the user and their friends, sorted by recency."""
+    try:
+        # the two friendship direction lookups are independent, so run them
+        # concurrently instead of serializing two round-trips
+        friends, friends_extended = await asyncio.gather(
+            database.fetch_all(
+                """
+                SELECT friend_id
+                FROM friendships
+                WHERE user_id = :user_id
+                """,
+                {"user_id": user.id},
+            ),
+            database.fetch_all(
+                "SELECT user_id FROM friendships WHERE friend_id = :user_id",
+                {"user_id": user.id},
+            ),
+        )
         friends_ids = [friend["friend_id"] for friend in friends]
-        friends_query = """
-            SELECT user_id FROM friendships WHERE friend_id = :user_id
-        """
-        friends_extended = await database.fetch_all(friends_query, {"user_id": user.id})
         friends_extended_ids = [friend["user_id"] for friend in friends_extended]
         all_ids = [user.id] + friends_ids + friends_extended_ids
 
@@ -303,9 +406,12 @@ async def get_all_reviews(user: User = Depends(get_current_user)):
             JOIN albums al ON s.album_id = al.id
             WHERE r.user_id = ANY(:user_ids)
             ORDER BY r.created_at DESC
+            LIMIT :limit OFFSET :offset
         """
 
-        reviews = await database.fetch_all(query, {"user_ids": all_ids})
+        reviews = await database.fetch_all(
+            query, {"user_ids": all_ids, "limit": limit, "offset": offset}
+        )
         return reviews
     except Exception as e:
         print(e)
@@ -365,18 +471,8 @@ async def get_user_reviews_by_username(
 ):
     """Get reviews from a specific user by their username."""
     try:
-        # get the user id from username
-        user_id = await database.fetch_val(
-            "SELECT id FROM users WHERE username = :username", {"username": username}
-        )
-
-        if not user_id:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="user not found"
-            )
-
         query = """
-            SELECT 
+            SELECT
                 r.id,
                 r.user_id,
                 r.song_id,
@@ -391,11 +487,33 @@ async def get_user_reviews_by_username(
             JOIN users u ON r.user_id = u.id
             JOIN songs s ON r.song_id = s.id
             JOIN albums al ON s.album_id = al.id
-            WHERE r.user_id = :user_id
+            WHERE u.username = :username
             ORDER BY r.created_at DESC
         """
 
-        reviews = await database.fetch_all(query, {"user_id": user_id})
+        # skip the user lookup entirely when the username was resolved
+        # recently; otherwise run it concurrently with the review fetch,
+        # which joins on username directly and doesn't need the id first
+        cached = _username_id_cache.get(username)
+        if cached and time.monotonic() - cached[0] < _USERNAME_CACHE_TTL:
+            user_id = cached[1]
+            reviews = await database.fetch_all(query, {"username": username})
+        else:
+            user_id, reviews = await asyncio.gather(
+                database.fetch_val(
+                    "SELECT id FROM users WHERE username = :username",
+                    {"username": username},
+                ),
+                database.fetch_all(query, {"username": username}),
+            )
+            if user_id:
+                _username_id_cache[username] = (time.monotonic(), user_id)
+
+        if not user_id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="user not found"
+            )
+
         return reviews
     except Exception as e:
         if isinstance(e, HTTPException):
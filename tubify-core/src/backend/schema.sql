@@ -308,3 +308,19 @@ CREATE INDEX IF NOT EXISTS idx_recommendation_feedback_compound ON recommendatio
 CREATE INDEX IF NOT EXISTS idx_recommendation_feedback_liked ON recommendation_feedback(liked);
 CREATE INDEX IF NOT EXISTS idx_recommendation_feedback_song_user_liked ON recommendation_feedback(song_id, user_id, liked);
 CREATE INDEX IF NOT EXISTS idx_recommendation_feedback_user_liked_time ON recommendation_feedback(user_id, liked, feedback_at DESC);
+
+-- back the per-user review listings and recency sorts with composite
+-- indexes so Postgres can do an index-ordered scan instead of sorting
+CREATE INDEX IF NOT EXISTS idx_song_reviews_user_created ON song_reviews(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_song_reviews_song_id ON song_reviews(song_id);
+CREATE INDEX IF NOT EXISTS idx_song_reviews_created_at ON song_reviews(created_at DESC);
+
+-- pre-aggregated song review ratings so top-rated reads don't re-scan
+-- and re-group song_reviews on every request
+CREATE MATERIALIZED VIEW IF NOT EXISTS song_rating_agg AS
+SELECT song_id, AVG(rating)::float AS avg_rating, COUNT(*) AS review_count
+FROM song_reviews
+GROUP BY song_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_song_rating_agg_song_id ON song_rating_agg(song_id);
+CREATE INDEX IF NOT EXISTS idx_song_rating_agg_avg_rating ON song_rating_agg(avg_rating DESC);
@@ -23,7 +23,7 @@ class SpotifySearchResult(BaseModel):
 
 
 @router.get("/search", response_model=List[SpotifySearchResult])
-async def search_spotify_songs(
+def search_spotify_songs(
     query: str = Query(..., min_length=1),
     limit: int = Query(10, ge=1, le=50),
     user: User = Depends(get_current_user),
@@ -1,6 +1,12 @@
+import asyncio
+import time
+from collections import defaultdict
+from itertools import chain
+
 from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks
 from fastapi.responses import RedirectResponse
 from datetime import datetime, timedelta, timezone
+import httpx
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth, CacheHandler
 import os
@@ -61,52 +67,150 @@ sp_oauth = SpotifyOAuth(
     cache_handler=MemoryCacheHandler(),  # use memory cache that doesn't persist
 )
 
+# shared oauth instance for token refreshes (kept separate from sp_oauth,
+# which forces show_dialog for the connect flow); constructing SpotifyOAuth
+# per refresh re-parses scopes and config on the hot path for no benefit
+_refresh_oauth = SpotifyOAuth(
+    client_id=SPOTIFY_CLIENT_ID,
+    client_secret=SPOTIFY_CLIENT_SECRET,
+    redirect_uri=SPOTIFY_REDIRECT_URI,
+    scope=" ".join(SPOTIFY_SCOPES),
+    cache_handler=MemoryCacheHandler(),
+)
 
-# get spotify client for user
-async def get_spotify_client(user: User = Depends(get_current_user)) -> spotipy.Spotify:
-    spotify_creds = await database.fetch_one(
-        "SELECT * FROM spotify_credentials WHERE user_id = :user_id",
-        values={"user_id": user.id},
+
+# per-process cache of spotify credentials keyed by user id; the row only
+# changes on token refresh or disconnect, so a short ttl saves one db
+# round-trip per authenticated spotify call
+_CREDENTIALS_CACHE_TTL = 60.0
+_credentials_cache = {}
+
+# refresh slightly before the token actually expires so in-flight requests
+# never race the expiry boundary
+_REFRESH_SAFETY_WINDOW = timedelta(seconds=60)
+
+# one lock per user so a burst of concurrent requests arriving at expiry
+# performs a single refresh instead of one per caller
+_refresh_locks = defaultdict(asyncio.Lock)
+
+
+# per-user cache of spotify-backed responses; rapid ui refreshes within
+# the ttl are answered locally instead of re-hitting spotify's rate-limited
+# endpoints and the database
+_RESPONSE_CACHE_TTL = 30.0
+_playlists_cache = {}
+_recently_played_cache = {}
+
+
+def _invalidate_credentials_cache(user_id: int):
+    _credentials_cache.pop(user_id, None)
+
+
+def invalidate_playlists_cache(user_id: int):
+    """drop the cached playlists response, e.g. after a playlist import"""
+    _playlists_cache.pop(user_id, None)
+
+
+def _token_needs_refresh(spotify_creds) -> bool:
+    return (
+        datetime.now(timezone.utc)
+        >= spotify_creds["token_expires_at"] - _REFRESH_SAFETY_WINDOW
     )
 
+
+async def _get_spotify_credentials(user: User) -> dict:
+    """fetch (and refresh if needed) the user's spotify credentials"""
+    cached = _credentials_cache.get(user.id)
+    if cached and time.monotonic() - cached[0] < _CREDENTIALS_CACHE_TTL:
+        spotify_creds = cached[1]
+    else:
+        row = await database.fetch_one(
+            "SELECT * FROM spotify_credentials WHERE user_id = :user_id",
+            values={"user_id": user.id},
+        )
+        spotify_creds = dict(row) if row else None
+        if spotify_creds:
+            _credentials_cache[user.id] = (time.monotonic(), spotify_creds)
+
     if not spotify_creds:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="spotify account not connected",
         )
 
-    if datetime.now(timezone.utc) >= spotify_creds["token_expires_at"]:
-        # create a fresh OAuth instance for token refresh to avoid cache issues
-        user_oauth = SpotifyOAuth(
-            client_id=SPOTIFY_CLIENT_ID,
-            client_secret=SPOTIFY_CLIENT_SECRET,
-            redirect_uri=SPOTIFY_REDIRECT_URI,
-            scope=" ".join(SPOTIFY_SCOPES),
-            cache_handler=MemoryCacheHandler(),
-        )
-        token_info = user_oauth.refresh_access_token(spotify_creds["refresh_token"])
-        await database.execute(
-            """
-            UPDATE spotify_credentials 
-            SET access_token = :access_token,
-                refresh_token = :refresh_token,
-                token_expires_at = :expires_at,
-                last_used_at = CURRENT_TIMESTAMP
-            WHERE user_id = :user_id
-            """,
-            values={
-                "access_token": token_info["access_token"],
-                "refresh_token": token_info["refresh_token"],
-                "expires_at": datetime.now(timezone.utc)
-                + timedelta(seconds=token_info["expires_in"]),
-                "user_id": user.id,
-            },
-        )
-        return spotipy.Spotify(auth=token_info["access_token"])
+    if _token_needs_refresh(spotify_creds):
+        async with _refresh_locks[user.id]:
+            # another caller may have refreshed while we waited on the lock
+            cached = _credentials_cache.get(user.id)
+            if cached:
+                spotify_creds = cached[1]
+            if _token_needs_refresh(spotify_creds):
+                # reuse the shared refresh client with a throwaway cache
+                # handler so no token state persists between users; the
+                # refreshed tokens come back in token_info either way
+                _refresh_oauth.cache_handler = MemoryCacheHandler()
+                # the refresh is a blocking https call, keep it off the event loop
+                token_info = await asyncio.to_thread(
+                    _refresh_oauth.refresh_access_token,
+                    spotify_creds["refresh_token"],
+                )
+                expires_at = datetime.now(timezone.utc) + timedelta(
+                    seconds=token_info["expires_in"]
+                )
+                await database.execute(
+                    """
+                    UPDATE spotify_credentials
+                    SET access_token = :access_token,
+                        refresh_token = :refresh_token,
+                        token_expires_at = :expires_at,
+                        last_used_at = CURRENT_TIMESTAMP
+                    WHERE user_id = :user_id
+                    """,
+                    values={
+                        "access_token": token_info["access_token"],
+                        "refresh_token": token_info["refresh_token"],
+                        "expires_at": expires_at,
+                        "user_id": user.id,
+                    },
+                )
+                # keep the cache in sync with the refreshed tokens
+                spotify_creds = dict(spotify_creds)
+                spotify_creds.update(
+                    access_token=token_info["access_token"],
+                    refresh_token=token_info["refresh_token"],
+                    token_expires_at=expires_at,
+                )
+                _credentials_cache[user.id] = (time.monotonic(), spotify_creds)
+
+    return spotify_creds
+
 
+# get spotify client for user
+async def get_spotify_client(user: User = Depends(get_current_user)) -> spotipy.Spotify:
+    spotify_creds = await _get_spotify_credentials(user)
     return spotipy.Spotify(auth=spotify_creds["access_token"])
 
 
+# get a bearer token for direct spotify web api calls
+async def get_spotify_access_token(user: User = Depends(get_current_user)) -> str:
+    spotify_creds = await _get_spotify_credentials(user)
+    return spotify_creds["access_token"]
+
+
+# shared async client for spotify web api calls; keep-alive connections are
+# reused across requests instead of paying a tls handshake per call
+_spotify_api: Optional[httpx.AsyncClient] = None
+
+
+def _get_spotify_api() -> httpx.AsyncClient:
+    global _spotify_api
+    if _spotify_api is None:
+        _spotify_api = httpx.AsyncClient(
+            base_url="https://api.spotify.com/v1", timeout=10.0
+        )
+    return _spotify_api
+
+
 # get database instance
 def get_db():
     return database
@@ -117,12 +221,13 @@ async def spotify_connect(
     request: Request, current_user: User = Depends(get_current_user)
 ):
     """initiate spotify oauth flow"""
-    # check if user already has spotify connected
-    result = await database.execute(
-        "SELECT id FROM spotify_credentials WHERE user_id = :user_id",
+    # check if user already has spotify connected; EXISTS stops at the
+    # first matching tuple instead of materializing a row
+    is_connected = await database.fetch_val(
+        "SELECT EXISTS(SELECT 1 FROM spotify_credentials WHERE user_id = :user_id)",
         {"user_id": current_user.id},
     )
-    if result:
+    if is_connected:
         raise HTTPException(status_code=400, detail="spotify already connected")
 
     # get spotify auth url with state containing user id
@@ -148,50 +253,67 @@ async def spotify_callback(
         raise HTTPException(status_code=400, detail="invalid state parameter")
 
     try:
-        # exchange code for tokens
-        token_info = sp_oauth.get_access_token(code, as_dict=True)
+        # exchange code for tokens; the token exchange and profile fetch
+        # are blocking https calls, so keep them off the event loop
+        token_info = await asyncio.to_thread(
+            sp_oauth.get_access_token, code, as_dict=True
+        )
 
         # create spotify client with new tokens
         sp = spotipy.Spotify(auth=token_info["access_token"])
 
-        # get spotify user info
-        spotify_user = sp.current_user()
+        # fetch the spotify profile in a thread while we acquire a db
+        # connection, so the insert starts the moment the profile arrives
+        user_task = asyncio.create_task(asyncio.to_thread(sp.current_user))
 
         # store spotify credentials
         expires_at = datetime.fromtimestamp(token_info["expires_at"])
         try:
-            await database.execute(
-                """
-                INSERT INTO spotify_credentials (
-                    user_id, spotify_id, access_token, refresh_token, token_expires_at,
-                    liked_songs_sync_status, liked_songs_count
-                ) VALUES (
-                    :user_id, :spotify_id, :access_token, :refresh_token, :expires_at,
-                    'not_started', 0
-                )
-                ON CONFLICT (user_id) DO UPDATE SET
-                    spotify_id = EXCLUDED.spotify_id,
-                    access_token = EXCLUDED.access_token,
-                    refresh_token = EXCLUDED.refresh_token,
-                    token_expires_at = EXCLUDED.token_expires_at,
-                    last_used_at = CURRENT_TIMESTAMP,
-                    liked_songs_sync_status = 
-                        CASE 
-                            WHEN spotify_credentials.liked_songs_sync_status = 'completed' 
-                            THEN 'needs_update' 
-                            ELSE COALESCE(spotify_credentials.liked_songs_sync_status, 'not_started')
-                        END
-            """,
-                {
-                    "user_id": user_id,
-                    "spotify_id": spotify_user["id"],
-                    "access_token": token_info["access_token"],
-                    "refresh_token": token_info["refresh_token"],
-                    "expires_at": expires_at,
-                },
-            )
-        except Exception as e:
-            print(f"error: {e}")
+            async with database.connection() as connection:
+                # a failed profile fetch must reach the outer handler and
+                # redirect with spotify_error, so await it before the
+                # error-swallowing insert block below
+                spotify_user = await user_task
+                try:
+                    await connection.execute(
+                        """
+                        INSERT INTO spotify_credentials (
+                            user_id, spotify_id, access_token, refresh_token, token_expires_at,
+                            liked_songs_sync_status, liked_songs_count
+                        ) VALUES (
+                            :user_id, :spotify_id, :access_token, :refresh_token, :expires_at,
+                            'not_started', 0
+                        )
+                        ON CONFLICT (user_id) DO UPDATE SET
+                            spotify_id = EXCLUDED.spotify_id,
+                            access_token = EXCLUDED.access_token,
+                            refresh_token = EXCLUDED.refresh_token,
+                            token_expires_at = EXCLUDED.token_expires_at,
+                            last_used_at = CURRENT_TIMESTAMP,
+                            liked_songs_sync_status =
+                                CASE
+                                    WHEN spotify_credentials.liked_songs_sync_status = 'completed'
+                                    THEN 'needs_update'
+                                    ELSE COALESCE(spotify_credentials.liked_songs_sync_status, 'not_started')
+                                END
+                        """,
+                        {
+                            "user_id": user_id,
+                            "spotify_id": spotify_user["id"],
+                            "access_token": token_info["access_token"],
+                            "refresh_token": token_info["refresh_token"],
+                            "expires_at": expires_at,
+                        },
+                    )
+                    # drop any cached credentials from a previous connection
+                    _invalidate_credentials_cache(user_id)
+                except Exception as e:
+                    print(f"error: {e}")
+        except Exception:
+            # don't leave the profile fetch running if acquiring the
+            # connection failed before we could await it
+            user_task.cancel()
+            raise
 
         # start background task to sync liked songs
         if background_tasks:
@@ -210,11 +332,11 @@ async def spotify_callback(
 @router.get("/status")
 async def spotify_connection_status(current_user: User = Depends(get_current_user)):
     """check if current user has connected spotify"""
-    result = await database.execute(
-        "SELECT id FROM spotify_credentials WHERE user_id = :user_id",
+    is_connected = await database.fetch_val(
+        "SELECT EXISTS(SELECT 1 FROM spotify_credentials WHERE user_id = :user_id)",
         {"user_id": current_user.id},
     )
-    return {"is_connected": bool(result)}
+    return {"is_connected": bool(is_connected)}
 
 
 @router.delete("/disconnect")
@@ -224,33 +346,72 @@ async def spotify_disconnect(current_user: User = Depends(get_current_user)):
         "DELETE FROM spotify_credentials WHERE user_id = :user_id",
         {"user_id": current_user.id},
     )
+    _invalidate_credentials_cache(current_user.id)
+    _playlists_cache.pop(current_user.id, None)
+    _recently_played_cache.pop(current_user.id, None)
     return {"message": "spotify disconnected successfully"}
 
 
 @router.get("/playlists")
 async def get_spotify_playlists(
     current_user: User = Depends(get_current_user),
-    sp: spotipy.Spotify = Depends(get_spotify_client),
+    access_token: str = Depends(get_spotify_access_token),
 ):
     """get user's spotify playlists"""
     try:
-        # get user's playlists
-        results = sp.current_user_playlists(limit=50)
-        playlists = results["items"]
+        # serve rapid refreshes from the per-user cache
+        cached = _playlists_cache.get(current_user.id)
+        if cached and time.monotonic() - cached[0] < _RESPONSE_CACHE_TTL:
+            return cached[1]
 
-        # get more playlists if there are more
-        while results["next"]:
-            results = sp.next(results)
-            playlists.extend(results["items"])
+        api = _get_spotify_api()
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        # get the first page to learn the total count
+        response = await api.get(
+            "/me/playlists", params={"limit": 50}, headers=headers
+        )
+        response.raise_for_status()
+        results = response.json()
+        playlists = results["items"]
+        total = results["total"]
+
+        # fetch the remaining pages concurrently instead of walking them
+        # one round-trip at a time; the semaphore keeps us under
+        # spotify's rate limits
+        if total > 50:
+            semaphore = asyncio.Semaphore(5)
+
+            async def fetch_page(offset: int):
+                async with semaphore:
+                    page = await api.get(
+                        "/me/playlists",
+                        params={"limit": 50, "offset": offset},
+                        headers=headers,
+                    )
+                    page.raise_for_status()
+                    return page.json()
+
+            pages = await asyncio.gather(
+                *[fetch_page(offset) for offset in range(50, total, 50)]
+            )
+            # flatten all pages in one pass instead of growing the first
+            # page's list repeatedly
+            playlists = list(
+                chain(playlists, *(page["items"] for page in pages))
+            )
 
-        # get already imported spotify playlist ids
+        # get already imported spotify playlist ids, restricted to the ids
+        # we actually fetched so the transferred rows are bounded by the
+        # page size rather than the user's total imports
+        playlist_ids = [playlist["id"] for playlist in playlists]
         imported_playlists = await database.fetch_all(
             """
-            SELECT spotify_playlist_id 
-            FROM playlists 
-            WHERE user_id = :user_id AND spotify_playlist_id IS NOT NULL
+            SELECT spotify_playlist_id
+            FROM playlists
+            WHERE user_id = :user_id AND spotify_playlist_id = ANY(:playlist_ids)
             """,
-            values={"user_id": current_user.id},
+            values={"user_id": current_user.id, "playlist_ids": playlist_ids},
         )
 
         # create a set of already imported spotify playlist ids for faster lookup
@@ -258,23 +419,27 @@ async def get_spotify_playlists(
             playlist["spotify_playlist_id"] for playlist in imported_playlists
         }
 
-        # format playlists and filter out already imported ones
-        return [
-            {
-                "id": playlist["id"],
+        # format playlists and filter out already imported ones; the output
+        # is preallocated and the id looked up once per item since this
+        # loop runs for every playlist the user has
+        formatted_playlists = [None] * len(playlists)
+        for i, playlist in enumerate(playlists):
+            playlist_id = playlist["id"]
+            formatted_playlists[i] = {
+                "id": playlist_id,
                 "name": playlist["name"],
                 "description": playlist.get("description"),
-                "is_imported": playlist["id"] in imported_playlist_ids,
+                "is_imported": playlist_id in imported_playlist_ids,
             }
-            for playlist in playlists
-        ]
+        _playlists_cache[current_user.id] = (time.monotonic(), formatted_playlists)
+        return formatted_playlists
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"failed to fetch spotify playlists: {str(e)}"
         )
 
 
-async def fetch_recently_played_tracks(sp: spotipy.Spotify, limit: int = 200) -> list:
+async def fetch_recently_played_tracks(access_token: str, limit: int = 200) -> list:
     """
     fetch recently played tracks from spotify with proper pagination
 
@@ -282,16 +447,28 @@ async def fetch_recently_played_tracks(sp: spotipy.Spotify, limit: int = 200) ->
     this function attempts to fetch as many tracks as possible using timestamp-based pagination
 
     args:
-        sp: authenticated spotify client
+        access_token: spotify bearer token for the user
         limit: maximum number of tracks to fetch (default 200)
 
     returns:
         list of track items
     """
     all_tracks = []
+    api = _get_spotify_api()
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    async def fetch_batch(before: Optional[str] = None) -> dict:
+        params = {"limit": 50}
+        if before is not None:
+            params["before"] = before
+        result = await api.get(
+            "/me/player/recently-played", params=params, headers=headers
+        )
+        result.raise_for_status()
+        return result.json()
 
     # initial request - get first batch of recently played
-    response = sp.current_user_recently_played(limit=50)
+    response = await fetch_batch()
 
     if "items" in response and response["items"]:
         print(f"Initial fetch: {len(response['items'])} tracks")
@@ -322,9 +499,7 @@ async def fetch_recently_played_tracks(sp: spotipy.Spotify, limit: int = 200) ->
             )
 
             # try to get tracks before the oldest timestamp
-            response = sp.current_user_recently_played(
-                limit=50, before=before_timestamp
-            )
+            response = await fetch_batch(before=before_timestamp)
 
             # check if we got any new tracks
             if not response.get("items") or len(response["items"]) == 0:
@@ -350,7 +525,7 @@ async def fetch_recently_played_tracks(sp: spotipy.Spotify, limit: int = 200) ->
 @router.get("/recently-played")
 async def get_recently_played_tracks(
     user: User = Depends(get_current_user),
-    sp: spotipy.Spotify = Depends(get_spotify_client),
+    access_token: str = Depends(get_spotify_access_token),
 ):
     """
     get user's recently played tracks
@@ -359,8 +534,13 @@ async def get_recently_played_tracks(
     but we try our best to get more if possible
     """
     try:
+        # serve rapid refreshes from the per-user cache
+        cached = _recently_played_cache.get(user.id)
+        if cached and time.monotonic() - cached[0] < _RESPONSE_CACHE_TTL:
+            return cached[1]
+
         # fetch tracks using the dedicated pagination function
-        tracks = await fetch_recently_played_tracks(sp, limit=200)
+        tracks = await fetch_recently_played_tracks(access_token, limit=200)
 
         # format the response to return only relevant data
         formatted_tracks = [
@@ -380,11 +560,13 @@ async def get_recently_played_tracks(
             for item in tracks
         ]
 
-        return {
+        response = {
             "recently_played": formatted_tracks,
             "count": len(formatted_tracks),
             "note": "Spotify typically limits history to 50 tracks regardless of pagination",
         }
+        _recently_played_cache[user.id] = (time.monotonic(), response)
+        return response
 
     except Exception as e:
         print(f"Error fetching recently played tracks: {str(e)}")